@@ -0,0 +1,67 @@
+# Project: VUT FIT SNT Project - Traveling Umpire Problem
+# Author: Dominik Harmim <harmim6@gmail.com>
+# Year: 2020
+# Description: A local client of the asynchronous solve service. It sends
+#              a single JSON request and prints received responses.
+
+from sys import argv, exit
+from json import loads, dumps
+from asyncio import open_unix_connection, run
+from typing import AsyncIterator
+from service import STREAM_OPS
+
+
+async def request(path: str, message: dict) -> AsyncIterator[dict]:
+    """
+    Sends a request to the solve service and yields its responses. Streaming
+    operations yield events until the job is done, the others yield a single
+    response.
+
+    :param path: A path of the Unix socket of the service.
+    :param message: A request to be sent.
+    :return: Responses of the service.
+    """
+    reader, writer = await open_unix_connection(path)
+    try:
+        writer.write(dumps(message).encode() + b'\n')
+        await writer.drain()
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+
+            response = loads(line)
+            yield response
+            if message.get('op') not in STREAM_OPS \
+                    or response['event'] in ('done', 'error'):
+                break
+    finally:
+        writer.close()
+
+
+async def print_responses(path: str, message: dict) -> None:
+    """
+    Prints responses of the solve service to a request.
+
+    :param path: A path of the Unix socket of the service.
+    :param message: A request to be sent.
+    """
+    async for response in request(path, message):
+        print(dumps(response))
+
+
+ARGC = 3  # number of expected arguments
+
+if __name__ == '__main__':
+    if len(argv) != ARGC:
+        print(f'Error: expecting {ARGC - 1} arguments:'
+              f' {argv[0]} socket request')
+        exit(1)
+
+    try:
+        run(print_responses(argv[1], loads(argv[2])))
+    except (ConnectionError, FileNotFoundError):
+        print(f"Error: the service is not listening on '{argv[1]}'.")
+        exit(1)
+    exit(0)
@@ -5,19 +5,27 @@
 #              Benders' cuts guided the neighbourhood search.
 
 from tup import Tup
+from pool import ElitePool
+from window import ConstraintWindow
 from random import randint
-from itertools import combinations, permutations
+from itertools import combinations
 from copy import deepcopy
 from typing import Callable
-from numpy import arange, zeros, int32, ones, where, ndarray, array_equal
+from numpy import arange, zeros, int32, ones, where, ndarray, array_equal, \
+    vstack, tile, argmax, argmin, array
 from numpy.random import choice
 from scipy.optimize import linear_sum_assignment
 
 NEIGH_SEARCH_ITERS = 10_000  # limit of iterations in the neighbourhood search
 NEIGH_SIZE = 2  # size of the umpire neighbourhood
+WEIGHTS_UPDATE_ITERS = 100  # iterations between updates of penalty weights
+POOL_SIZE = 10  # maximal number of elite solutions
+POOL_DIVERSITY = 0.05  # minimal ratio of different assignments in the pool
+STAGNATION_ITERS = 10  # non-improving searches triggering the path relinking
 
 
-def gmh(inp_file: str, d1: int, d2: int, name: str, time_limit: int) -> None:
+def gmh(inp_file: str, d1: int, d2: int, name: str, time_limit: int,
+        observer: Callable[[int, bool, str], None] = None) -> None:
     """
     The greedy matching heuristic algorithm. It reads an input instance of the
     Traveling Umpire Problem and produces a solution as optimal as possible. It
@@ -30,15 +38,19 @@ def gmh(inp_file: str, d1: int, d2: int, name: str, time_limit: int) -> None:
     :param d2: The parameter d2 for 5. constraint.
     :param name: A name of an instance of the problem.
     :param time_limit: A time limit of the computation in minutes.
+    :param observer: A function called with a distance, feasibility, and
+                     a solution whenever a solution is printed.
     """
     # initial solution
-    tup = Tup(inp_file, d1, d2, name, time_limit)
+    tup = Tup(inp_file, d1, d2, name, time_limit, observer)
 
     backtrack_constraint = zeros((tup.rounds, tup.umps * tup.umps), dtype=int32)
     prev_game_numbers = None
 
     # greedy matching for all rounds
     r = 1
+    windows = [tup.constraint_window(0)]
+    windows_solution = deepcopy(tup.solution)
     while r < tup.rounds:
         tup.time_limit_check()
 
@@ -48,15 +60,16 @@ def gmh(inp_file: str, d1: int, d2: int, name: str, time_limit: int) -> None:
         distances = tup.umps_distances(solutions, r)
         r_distances = distances[r].reshape((tup.umps, tup.umps))
 
+        # 4. and 5. constraint are evaluated only in the window of the last
+        # rounds
+        window = restore_window(tup, windows, windows_solution, r)
+        constraints45, prev_constraints45 = tup.window_constraints(window, r)
+
         constraint3 = tup.constraint3(solutions, r)
-        constraint4 = tup.constraint4(solutions, r)
-        constraint4_sum = constraint4.sum(axis=0)
-        constraint5 = tup.constraint5(solutions, r)
-        constraint5_sum = constraint5.sum(axis=0)
-        constraints = \
-            constraint3 + constraint4 + constraint5 + backtrack_constraint
+        constraints = constraint3 + backtrack_constraint
         r_constraints = \
-            constraints[r:].sum(axis=0).reshape((tup.umps, tup.umps))
+            (constraints[r:].sum(axis=0) + constraints45) \
+            .reshape((tup.umps, tup.umps))
 
         backtrack_constraint_sum = backtrack_constraint.sum(axis=0)
         backtrack_constraint = zeros(solutions.shape, dtype=int32)
@@ -67,7 +80,7 @@ def gmh(inp_file: str, d1: int, d2: int, name: str, time_limit: int) -> None:
         tup.solution = solutions[:, game_numbers]
 
         constraint_sums = \
-            constraint4_sum[game_numbers] + constraint5_sum[game_numbers] \
+            constraints45[game_numbers] + prev_constraints45[game_numbers] \
             + backtrack_constraint_sum[game_numbers]
         # there is no perfect match
         if constraint_sums.sum():
@@ -85,11 +98,15 @@ def gmh(inp_file: str, d1: int, d2: int, name: str, time_limit: int) -> None:
                     tup.penalty * tup.PENALTY
                 continue
 
-            # do the large neighbourhood search with the Benders' cuts
+            # do the large neighbourhood search with the Benders' cuts, start
+            # the greedy matching again from another initial solution if
+            # there are no Benders' cuts or they cannot be satisfied
             cuts = benders_cuts(tup, r)
-            if not cuts:
-                continue
-            tup = neigh_search(tup, r - 1, cuts)
+            if not cuts or not neigh_search(tup, r - 1, cuts):
+                tup.solution = tup.init_solution(tup.rounds, tup.umps)
+                tup.backtracked[1:] = [False] * (tup.rounds - 1)
+                backtrack_constraint[:] = 0
+                r = 1
             continue
 
         prev_game_numbers = deepcopy(game_numbers)
@@ -103,16 +120,77 @@ def gmh(inp_file: str, d1: int, d2: int, name: str, time_limit: int) -> None:
         tup.umps_distances(tup.solution, r).sum() \
         + tup.constraint3(tup.solution, r).sum()
 
+    # distinct solutions differ in at least 2 assignments (a single swap)
+    pool = ElitePool(tup.rounds, tup.umps, POOL_SIZE,
+                     max(3, int(POOL_DIVERSITY * tup.rounds * tup.umps)))
+
     # try to improve a solution using the large neighbourhood search
-    prev_score = calculate_score()
+    best_score = calculate_score()
+    stagnation = 0
     while True:
-        neigh_search(tup, r, [])
+        neigh_search(tup, r, [], pool)
 
         score = calculate_score()
-        if score < prev_score:
+        if feasible(tup, tup.solution):
+            pool.add(tup.solution, score)
+        if score < best_score:
+            stagnation = 0
+            best_score = score
             print(f'Distance: {tup.umps_distances(tup.solution, r).sum()}')
             tup.print_solution()
-        prev_score = score
+        else:
+            stagnation += 1
+
+        if stagnation < STAGNATION_ITERS:
+            continue
+        stagnation = 0
+
+        # relink the solution with an elite solution if the search stagnates
+        solution, score = path_relinking(tup, tup.solution, pool)
+        if solution is not None:
+            pool.add(solution, score)
+            if score < best_score:
+                tup.solution = solution
+                best_score = score
+                print(f'Distance: '
+                      f'{tup.umps_distances(tup.solution, r).sum()}')
+                tup.print_solution()
+                continue
+
+        # otherwise, continue from a perturbed elite solution to find elite
+        # solutions far enough from the current ones
+        elite = pool.sample() if len(pool) else tup.solution
+        tup.solution = perturb(tup, elite, pool.min_distance)
+
+
+def restore_window(tup: Tup, windows: list, solution: ndarray, r: int) \
+        -> ConstraintWindow:
+    """
+    Returns a window of venues of umpires advanced to a current round of the
+    solution. Windows advanced to single rounds are kept, so if previous rounds
+    have been changed (by the backtracking or the neighbourhood search), the
+    window is restored from the first changed round instead of being rebuilt
+    from the first round.
+
+    :param tup: The Traveling Umpire Problem instance.
+    :param windows: Windows advanced to single rounds (indexes) of a given
+                    solution, they are updated for the current solution.
+    :param solution: A solution of the windows, it is updated to the current
+                     solution.
+    :param r: A current round.
+    :return: A window advanced to a current round of the solution.
+    """
+    changed = where((tup.solution[:r] != solution[:r]).any(axis=1))[0]
+    k = min(changed[0] if len(changed) else r, len(windows) - 1)
+    del windows[k + 1:]
+    solution[:] = tup.solution
+
+    for k in range(k, r):
+        window = windows[k].copy()
+        tup.advance_window(window, k)
+        windows.append(window)
+
+    return windows[r]
 
 
 def benders_cuts(tup: Tup, r: int) -> list:
@@ -121,7 +199,10 @@ def benders_cuts(tup: Tup, r: int) -> list:
 
     :param tup: The Traveling Umpire Problem instance.
     :param r: A round for which the Benders' cuts will be calculated.
-    :return: The Benders' cuts in the round r.
+    :return: The Benders' cuts in the round r in a canonical form. A cut is
+             a sorted tuple of parts for single umpires, a part is a sorted
+             tuple of constraints for single games, and constraints are
+             sorted tuples of pairs of a venue and a round.
     """
     venues = tup.venues_of_umps(tup.solution)
     out_venues = tup.venues_of_umps(tup.solution, home=False)
@@ -145,7 +226,8 @@ def benders_cuts(tup: Tup, r: int) -> list:
                     match[i, j] = 0
                     break
 
-    # find the Benders' cuts for all subsets of umpires
+    # find the Benders' cuts for all subsets of umpires, umpires are
+    # interchangeable, so cuts are stored in a canonical form without them
     cuts = []
     for length in range(1, tup.umps + 1):
         for umps in combinations(range(tup.umps), length):
@@ -158,14 +240,15 @@ def benders_cuts(tup: Tup, r: int) -> list:
             if games_card < umps_card:
                 infeasible_games = set(range(0, tup.umps)) - games
                 cut = []
-                for i in infeasible_games:
-                    for j in umps:
+                for j in umps:
+                    ump_constraints = []
+                    for i in infeasible_games:
                         constraints = []
 
                         # 4. constraint
                         for x in range(r - tup.q1 + 1, r):
                             if venues[r, i] == venues[x, j]:
-                                constraints.append((venues[x, j], x, j))
+                                constraints.append((int(venues[x, j]), x))
 
                         # 5. constraint
                         for x in range(r - tup.q2 + 1, r):
@@ -173,70 +256,73 @@ def benders_cuts(tup: Tup, r: int) -> list:
                                     or out_venues[r, i] == out_venues[x, j] \
                                     or venues[r, i] == out_venues[x, j] \
                                     or out_venues[r, i] == venues[x, j]:
-                                constraints.append((venues[x, j], x, j))
-
-                        cut.append(list(set(constraints)))
-                cuts.append(cut)
-
-    # find all permutations of the Benders' cuts
-    cut_perms = []
-    for cut in cuts:
-        umps = []
-        for constraints in cut:
-            umps.append(constraints[0][2])
+                                constraints.append((int(venues[x, j]), x))
 
-        for ump in permutations(umps):
-            new_cut = []
-            for c, constraint in enumerate(cut):
-                new_constraint = []
-                for venue, r, _ in constraint:
-                    new_constraint.append((venue, r, ump[c]))
-                new_cut.append(new_constraint)
-            cut_perms.append(new_cut)
+                        ump_constraints.append(tuple(sorted(set(constraints))))
+                    cut.append(tuple(sorted(set(ump_constraints))))
+                cuts.append(tuple(sorted(cut)))
 
-    return cut_perms
+    # every canonical cut is stored only once
+    return list(dict.fromkeys(cuts))
 
 
-def benders_violations(venues: ndarray, cuts: list) -> int:
+def benders_violations(venues: ndarray, cuts: list) -> (int, int):
     """
-    Calculates the number of violated Benders' cuts.
+    Calculates the number of violated Benders' cuts. A canonical cut is
+    violated if its parts can be assigned to distinct umpires such that every
+    umpire violates all constraints of its part, i.e., if some relabelling of
+    umpires violates the cut. The number of pairs of a part and an umpire
+    violating it in violated cuts measures how far cuts are from being
+    satisfied.
 
     :param venues: Home venues of umpires.
-    :param cuts: The Benders' cuts for checking their violation.
-    :return: The number of violated Benders' cuts.
+    :param cuts: The Benders' cuts in a canonical form for checking their
+                 violation.
+    :return: A tuple with the number of violated Benders' cuts and the number
+             of pairs of a part and an umpire violating it in violated cuts.
     """
-    violations = len(cuts)
+    violations = degree = 0
 
     for cut in cuts:
-        for constraints in cut:
-            violated = False
-            for venue, r, ump in constraints:
-                if venues[r, ump] == venue:
-                    violated = True
-                    break
-            if not violated:
-                violations -= 1
-                break
+        # match matrix between parts of the cut and umpires violating them
+        match = ones((len(cut), venues.shape[1]), dtype=bool)
+        for part, ump_constraints in enumerate(cut):
+            for constraints in ump_constraints:
+                cut_venues, rounds = array(constraints).T
+                match[part] &= \
+                    (venues[rounds] == cut_venues.reshape((-1, 1))).any(axis=0)
 
-    return violations
+        parts, umps = linear_sum_assignment(~match)
+        if match[parts, umps].all():
+            violations += 1
+            degree += int(match.sum())
 
+    return violations, degree
 
-def neigh_search(tup: Tup, r: int, cuts: list) -> Tup:
+
+def neigh_search(tup: Tup, r: int, cuts: list, pool: ElitePool = None) \
+        -> bool:
     """
     The very large neighbourhood search algorithm. It finds (partial) solution
-    that satisfies constraints and all the Benders' cuts.
+    that satisfies constraints and all the Benders' cuts. It gives up if the
+    Benders' cuts are not satisfied within the limit of non-improving
+    iterations.
 
     :param tup: The Traveling Umpire Problem instance.
     :param r: A current round.
     :param cuts: The Benders' cuts that should be satisfied.
-    :return: (Partial) solution that satisfies constraints and all the
-             Benders' cuts.
+    :param pool: A pool of elite solutions for restarts of the search and for
+                 collecting found feasible solutions.
+    :return: True if (partial) solution that satisfies constraints and all
+             the Benders' cuts has been found, False if the search has given
+             up.
     """
-    global NEIGH_SEARCH_ITERS, NEIGH_SIZE
+    global NEIGH_SEARCH_ITERS, NEIGH_SIZE, WEIGHTS_UPDATE_ITERS
 
-    prev_objective, _, _, _ = neigh_search_objective(tup, tup.solution, r, cuts)
+    prev_objective, _, _, _, _ = \
+        neigh_search_objective(tup, tup.solution, r, cuts)
     best_solution = deepcopy(tup.solution)
-    n = 0
+    n = m = 0
     while True:
         tup.time_limit_check()
 
@@ -248,10 +334,10 @@ def neigh_search(tup: Tup, r: int, cuts: list) -> Tup:
         while True:
             swap = choice(ump_solution, size=NEIGH_SIZE, replace=False)
             if not array_equal(ump_solution, swap):
-                solution[i, umps] = swap
+                swap_games(solution, i, umps, swap)
                 break
 
-        objective, constraint3, constraints45, violations = \
+        objective, constraint3, constraints45, violations, _ = \
             neigh_search_objective(tup, solution, r, cuts)
 
         # updates the solution if the objective is improved
@@ -263,40 +349,214 @@ def neigh_search(tup: Tup, r: int, cuts: list) -> Tup:
         # solution satisfies all conditions
         if not constraints45 and ((cuts and not violations)
                                   or (not cuts and not constraint3)):
+            # keep also a non-improving feasible solution as an elite one
+            if pool is not None and not constraint3:
+                pool.add(solution, objective)
             tup.solution = deepcopy(best_solution)
-            return tup
+            return True
+
+        # adapt weights of penalties according to violations of the current
+        # local optimum (the guided local search)
+        m += 1
+        if m == WEIGHTS_UPDATE_ITERS:
+            m = 0
+            _, _, _, _, rounds45 = \
+                neigh_search_objective(tup, best_solution, r, cuts)
+            tup.update_weights(rounds45)
+            prev_objective, _, _, _, _ = \
+                neigh_search_objective(tup, best_solution, r, cuts)
 
         # test iterations limit
         n += 1
         if n == NEIGH_SEARCH_ITERS:
+            if cuts:
+                return False
             n = 0
-            best_solution = deepcopy(tup.solution)
-            prev_objective, _, _, _ = \
+            best_solution = pool.sample() if pool else deepcopy(tup.solution)
+            prev_objective, _, _, _, _ = \
                 neigh_search_objective(tup, best_solution, r, cuts)
 
 
 def neigh_search_objective(tup: Tup, solution: ndarray, r: int, cuts: list) \
-        -> (int, int, int, int):
+        -> (int, int, int, int, ndarray):
     """
     Calculates the objective function of the large neighbourhood search.
+    Penalties of 4. and 5. constraint are weighted by adaptive weights.
 
     :param tup: The Traveling Umpire Problem instance.
     :param solution: A solution for the calculation of the objective function.
     :param r: A current round.
     :param cuts: The Benders' cuts that should be satisfied.
     :return: A tuple with a value of the objective function, 3. constraint,
-             4. and 5. constraint, and the number of Benders' cuts violations.
+             4. and 5. constraint, the number of Benders' cuts violations,
+             and flags of violated 4. and 5. constraint in single rounds.
     """
     constraint3 = tup.constraint3(solution, r).sum()
-    constraints45 = \
-        tup.constraint4(solution, r).sum() + tup.constraint5(solution, r).sum()
+    constraint4 = tup.constraint4(solution, r, tup.weights[0])
+    constraint5 = tup.constraint5(solution, r, tup.weights[1])
+    constraints45 = constraint4.sum() + constraint5.sum()
+    rounds45 = vstack((constraint4.sum(axis=1), constraint5.sum(axis=1))) > 0
 
     objective = \
         tup.umps_distances(solution, r).sum() + constraint3 + constraints45
 
     violations = 0
     if cuts:
-        violations = benders_violations(tup.venues_of_umps(solution), cuts)
-        objective += violations * tup.penalty * tup.PENALTY
+        violations, degree = \
+            benders_violations(tup.venues_of_umps(solution), cuts)
+        objective += \
+            violations * tup.penalty * tup.PENALTY + degree * tup.penalty
+
+    return objective, constraint3, constraints45, violations, rounds45
+
+
+def feasible(tup: Tup, solution: ndarray) -> bool:
+    """
+    Checks whether a complete solution satisfies all constraints.
+
+    :param tup: The Traveling Umpire Problem instance.
+    :param solution: A solution to be checked.
+    :return: True if the solution is feasible, False otherwise.
+    """
+    r = tup.rounds - 1
+    constraints = \
+        tup.constraint3(solution, r) + tup.constraint4(solution, r) \
+        + tup.constraint5(solution, r)
+
+    return not constraints.sum()
+
+
+def swap_games(solution: ndarray, i: int, umps: ndarray, games: ndarray) \
+        -> None:
+    """
+    Assigns games of given umpires in a round to them in a different order.
+    Solutions are kept in a canonical form (the i-th umpire has the i-th game
+    in the first round), so a swap in the first round is done as the
+    equivalent relabelling of the umpires in the other rounds.
+
+    :param solution: A solution in a canonical form to be changed in place.
+    :param i: A round of the swap.
+    :param umps: Indexes of umpires.
+    :param games: Games of the umpires in the round after the swap.
+    """
+    if i:
+        solution[i, umps] = games
+    else:
+        solution[1:, games - 1] = solution[1:, umps]
+
+
+def perturb(tup: Tup, solution: ndarray, distance: int) -> ndarray:
+    """
+    Perturbs a solution by random swaps of games between two umpires in
+    a round, until it differs from the original solution in a given number
+    of assignments.
+
+    :param tup: The Traveling Umpire Problem instance.
+    :param solution: A solution to be perturbed.
+    :param distance: The minimal Hamming distance of the perturbed solution.
+    :return: The perturbed solution.
+    """
+    perturbed = deepcopy(solution)
+    while (perturbed != solution).sum() < distance:
+        i = randint(0, tup.rounds - 1)
+        umps = choice(arange(tup.umps), size=2, replace=False)
+        swap_games(perturbed, i, umps, perturbed[i, umps[::-1]])
+
+    return perturbed
+
+
+def path_relinking(tup: Tup, solution: ndarray, pool: ElitePool) \
+        -> (ndarray, int):
+    """
+    The path relinking between a given solution and a random different
+    solution from the pool of elite solutions, in both directions. Paths are
+    walked using swaps of games between two umpires in a round, between
+    canonical forms of solutions.
+
+    :param tup: The Traveling Umpire Problem instance.
+    :param solution: A solution to be relinked.
+    :param pool: A pool of elite solutions.
+    :return: A tuple with the best feasible intermediate solution and its
+             score, or None and None if there is no such solution.
+    """
+    solution = Tup.canonical_solution(solution)
+    others = where(pool.distances(solution) > 0)[0]
+    if not len(others):
+        return None, None
+    elite = pool.solution(choice(others))
+
+    best_solution, best_score = None, None
+    for initiating, guiding in (solution, elite), (elite, solution):
+        path_solution, path_score = relink(tup, initiating, guiding)
+        if path_solution is not None \
+                and (best_score is None or path_score < best_score):
+            best_solution, best_score = path_solution, path_score
+
+    return best_solution, best_score
+
+
+def relink(tup: Tup, initiating: ndarray, guiding: ndarray) \
+        -> (ndarray, int):
+    """
+    Walks a path from an initiating solution to a guiding solution. In every
+    step, the best swap move assigning some umpire its game from the guiding
+    solution is chosen.
+
+    :param tup: The Traveling Umpire Problem instance.
+    :param initiating: A solution where the path starts.
+    :param guiding: A solution where the path ends.
+    :return: A tuple with the best feasible intermediate solution and its
+             score, or None and None if there is no such solution.
+    """
+    solution = deepcopy(initiating)
+    best_solution, best_score = None, None
+    while True:
+        tup.time_limit_check()
+
+        rounds, umps = where(solution != guiding)
+        # the last step reaches the guiding solution
+        if len(rounds) <= 2:
+            break
+
+        # swap moves towards the guiding solution
+        games = guiding[rounds, umps]
+        others = argmax(solution[rounds] == games.reshape((-1, 1)), axis=1)
+        moves = arange(len(rounds))
+        candidates = tile(solution, (len(rounds), 1, 1))
+        candidates[moves, rounds, others] = solution[rounds, umps]
+        candidates[moves, rounds, umps] = games
+
+        scores, feasibility = relink_scores(tup, candidates)
+        move = argmin(scores)
+        solution = candidates[move]
+        if feasibility[move] \
+                and (best_score is None or scores[move] < best_score):
+            best_solution, best_score = deepcopy(solution), int(scores[move])
+
+    return best_solution, best_score
+
+
+def relink_scores(tup: Tup, candidates: ndarray) -> (ndarray, ndarray):
+    """
+    Calculates scores of candidate solutions at once. Candidates are placed
+    side by side as columns of a single solution.
+
+    :param tup: The Traveling Umpire Problem instance.
+    :param candidates: Candidate solutions (candidates, rounds, umpires).
+    :return: A tuple with scores of candidates and flags of their
+             feasibility.
+    """
+    n, rounds, umps = candidates.shape
+    solutions = candidates.transpose((1, 0, 2)).reshape((rounds, n * umps))
+    r = rounds - 1
+
+    distances = tup.umps_distances(solutions, r).sum(axis=0)
+    constraint3 = tup.constraint3(solutions, r).sum(axis=0)
+    constraints45 = \
+        tup.constraint4(solutions, r, tup.weights[0]).sum(axis=0) \
+        + tup.constraint5(solutions, r, tup.weights[1]).sum(axis=0)
+
+    scores = (distances + constraint3 + constraints45).reshape((n, umps))
+    violations = (constraint3 + constraints45).reshape((n, umps))
 
-    return objective, constraint3, constraints45, violations
+    return scores.sum(axis=1), violations.sum(axis=1) == 0
@@ -3,7 +3,8 @@
 # Year: 2020
 # Description: Functions for reading and parsing input files.
 
-from os.path import abspath, dirname, exists
+from os import listdir
+from os.path import abspath, dirname, exists, splitext
 from re import search, split
 from numpy import ndarray, array
 
@@ -27,6 +28,20 @@ def get_inp_file(name: str) -> str:
     return file
 
 
+def get_inp_names() -> list:
+    """
+    Retrieves names of all instances of the problem in the input directory.
+
+    :return: Names of all instances of the problem in the input directory.
+    """
+    global IN_DIR
+
+    inp_dir = abspath(dirname(__file__) + f'/../{IN_DIR}')
+
+    return [splitext(file)[0] for file in listdir(inp_dir)
+            if file.endswith('.txt')]
+
+
 def parse_inp_file(file: str) -> (int, ndarray, ndarray):
     """
     Parses an input file.
@@ -0,0 +1,141 @@
+# Project: VUT FIT SNT Project - Traveling Umpire Problem
+# Author: Dominik Harmim <harmim6@gmail.com>
+# Year: 2020
+# Description: A definition of a class that represents a pool of diverse
+#              elite solutions.
+
+from numpy import ndarray, zeros, int32, min_scalar_type, argmin, concatenate
+from numpy.random import randint
+from tup import Tup
+
+
+class ElitePool:
+    """
+    A class that represents a pool of diverse elite solutions. Solutions are
+    stored in a canonical form, so relabellings of umpires are not
+    distinguished.
+    """
+
+    def __init__(self, rounds: int, umps: int, size: int,
+                 min_distance: int) -> None:
+        """
+        Constructs an empty pool of elite solutions.
+
+        :param rounds: The number of rounds.
+        :param umps: The number of umpires.
+        :param size: The maximal number of solutions in the pool.
+        :param min_distance: The minimal Hamming distance between solutions
+                             in the pool.
+        """
+        super().__init__()
+
+        self.__size = size
+        self.__min_distance = min_distance
+        # solutions are stored compactly in the smallest sufficient type
+        self.__solutions = zeros((0, rounds, umps), dtype=min_scalar_type(umps))
+        self.__scores = zeros(0, dtype=int32)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of solutions in the pool.
+
+        :return: The number of solutions in the pool.
+        """
+        return self.__solutions.shape[0]
+
+    @property
+    def min_distance(self) -> int:
+        """
+        Returns the minimal Hamming distance between solutions in the pool.
+
+        :return: The minimal Hamming distance between solutions in the pool.
+        """
+        return self.__min_distance
+
+    @property
+    def scores(self) -> ndarray:
+        """
+        Returns scores of solutions in the pool.
+
+        :return: Scores of solutions in the pool.
+        """
+        return self.__scores
+
+    def solution(self, i: int) -> ndarray:
+        """
+        Returns the i-th solution of the pool.
+
+        :param i: An index of a solution.
+        :return: The i-th solution of the pool.
+        """
+        return self.__solutions[i].astype(int32)
+
+    def sample(self) -> ndarray:
+        """
+        Returns a random solution of the pool.
+
+        :return: A random solution of the pool.
+        """
+        return self.solution(randint(len(self)))
+
+    def distances(self, solution: ndarray) -> ndarray:
+        """
+        Returns Hamming distances between a given solution and solutions in
+        the pool.
+
+        :param solution: A solution for which the distances are returned.
+        :return: Hamming distances between a given solution and solutions in
+                 the pool.
+        """
+        solution = Tup.canonical_solution(solution)
+
+        return (self.__solutions != solution).sum(axis=(1, 2))
+
+    def add(self, solution: ndarray, score: int) -> bool:
+        """
+        Adds a solution to the pool. A solution too close to a solution in the
+        pool replaces it only if it is better. If the pool is full,
+        a solution replaces the closest one of the worse solutions, so the
+        pool stays diverse.
+
+        :param solution: A solution to be added.
+        :param score: A score of the solution.
+        :return: True if the solution has been added, False otherwise.
+        """
+        solution = Tup.canonical_solution(solution)
+        if len(self):
+            distances = self.distances(solution)
+            closest = argmin(distances)
+            if distances[closest] < self.__min_distance:
+                return self.__replace(closest, solution, score)
+
+            if len(self) == self.__size:
+                worse = self.__scores > score
+                if not worse.any():
+                    return False
+                distances[~worse] = distances.max() + 1
+                return self.__replace(argmin(distances), solution, score)
+
+        self.__solutions = \
+            concatenate((self.__solutions, solution[None].astype(
+                self.__solutions.dtype)))
+        self.__scores = concatenate((self.__scores, [score])).astype(int32)
+
+        return True
+
+    def __replace(self, i: int, solution: ndarray, score: int) -> bool:
+        """
+        Replaces the i-th solution of the pool if a given solution is better.
+
+        :param i: An index of a solution to be replaced.
+        :param solution: A new solution.
+        :param score: A score of the new solution.
+        :return: True if the solution has been replaced, False otherwise.
+        """
+        if score >= self.__scores[i]:
+            return False
+
+        self.__solutions[i] = solution
+        self.__scores[i] = score
+
+        return True
@@ -0,0 +1,473 @@
+# Project: VUT FIT SNT Project - Traveling Umpire Problem
+# Author: Dominik Harmim <harmim6@gmail.com>
+# Year: 2020
+# Description: An asynchronous solve service. It accepts solve jobs over
+#              a Unix socket (newline-delimited JSON), runs them on a bounded
+#              pool of worker processes, and streams incumbent solutions.
+
+import sys
+from sys import argv, exit
+from os import cpu_count, devnull
+from math import isfinite
+from time import monotonic
+from itertools import count
+from json import loads, dumps
+from asyncio import Event, Queue, Semaphore, StreamReader, StreamWriter, \
+    TimeoutError, get_running_loop, run, start_unix_server, wait_for
+from multiprocessing import get_context
+from multiprocessing.connection import Connection
+from inp import get_inp_file, get_inp_names
+from gmh import gmh
+
+NO_TIME_LIMIT = 10 ** 9  # time limit of workers, the service enforces deadlines
+STREAM_OPS = 'solve', 'watch'  # operations that stream events until 'done'
+# workers are not forked from the multithreaded service process
+CONTEXT = get_context('spawn')
+
+
+def solve(inp_file: str, d1: int, d2: int, name: str,
+          conn: Connection) -> None:
+    """
+    Runs the greedy matching heuristic in a worker process and sends found
+    solutions through a connection. The heuristic never returns, so an
+    exception is sent through the connection as an error.
+
+    :param inp_file: A name of an input file.
+    :param d1: The parameter d1 for 4. constraint.
+    :param d2: The parameter d2 for 5. constraint.
+    :param name: A name of an instance of the problem.
+    :param conn: A connection for sending found solutions.
+    """
+    sys.stdout = open(devnull, 'w')
+
+    def observer(distance: int, feasible: bool, solution: str) -> None:
+        conn.send({'distance': distance, 'feasible': feasible,
+                   'solution': solution})
+
+    try:
+        gmh(inp_file, d1, d2, name, NO_TIME_LIMIT, observer)
+    except Exception as e:
+        conn.send({'error': repr(e)})
+    finally:
+        conn.close()
+
+
+class Job:
+    """ A class that represents a solve job of the service. """
+
+    def __init__(self, job_id: int, name: str, d1: int, d2: int,
+                 time_limit: float) -> None:
+        """
+        Constructs a solve job.
+
+        :param job_id: An identifier of the job.
+        :param name: A name of an instance of the problem.
+        :param d1: The parameter d1 for 4. constraint.
+        :param d2: The parameter d2 for 5. constraint.
+        :param time_limit: A time limit of the computation in minutes.
+        """
+        super().__init__()
+
+        self.id = job_id
+        self.name = name
+        self.d1 = d1
+        self.d2 = d2
+        self.time_limit = time_limit
+        self.status = 'queued'
+        self.incumbent = None
+        self.improvements = 0
+        self.start = None
+        self.end = None
+        self.cancelled = False
+        self.exited = False
+        self.error = None
+        self.exitcode = None
+        self.wakeup = Event()
+        self.__subscribers = set()
+
+    @property
+    def key(self) -> tuple:
+        """
+        Returns a key identifying identical jobs.
+
+        :return: A key identifying identical jobs.
+        """
+        return self.name, self.d1, self.d2
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Returns the number of seconds the job has been running.
+
+        :return: The number of seconds the job has been running.
+        """
+        if not self.start:
+            return 0.0
+
+        return round((self.end or monotonic()) - self.start, 3)
+
+    def summary(self) -> dict:
+        """
+        Returns a summary of the job state and statistics.
+
+        :return: A summary of the job state and statistics.
+        """
+        return {'job': self.id, 'instance': self.name, 'd1': self.d1,
+                'd2': self.d2, 'time_limit': self.time_limit,
+                'status': self.status, 'elapsed': self.elapsed,
+                'improvements': self.improvements,
+                'incumbent': self.incumbent, 'error': self.error}
+
+    def subscribe(self) -> Queue:
+        """
+        Subscribes for events of the job.
+
+        :return: A queue with events of the job.
+        """
+        queue = Queue()
+        self.__subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: Queue) -> None:
+        """
+        Unsubscribes a queue from events of the job.
+
+        :param queue: A queue to be unsubscribed.
+        """
+        self.__subscribers.discard(queue)
+
+    def publish(self, event: str, **data) -> None:
+        """
+        Publishes an event to all subscribers.
+
+        :param event: A type of the event.
+        :param data: Data of the event.
+        """
+        message = {'event': event, 'job': self.id, **data}
+        for queue in self.__subscribers:
+            queue.put_nowait(message)
+
+
+class Service:
+    """ A class that represents the asynchronous solve service. """
+
+    def __init__(self, workers: int) -> None:
+        """
+        Constructs the solve service.
+
+        :param workers: The maximal number of concurrently running jobs.
+        """
+        super().__init__()
+
+        self.__slots = Semaphore(workers)
+        self.__jobs = {}
+        self.__in_flight = {}
+        self.__ids = count(1)
+        self.__handlers = {
+            'solve': self.__op_solve,
+            'watch': self.__op_watch,
+            'cancel': self.__op_cancel,
+            'deadline': self.__op_deadline,
+            'status': self.__op_status,
+        }
+
+    async def handle(self, reader: StreamReader, writer: StreamWriter) \
+            -> None:
+        """
+        Handles requests of a single client connection.
+
+        :param reader: A reader of the connection.
+        :param writer: A writer of the connection.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    request = loads(line)
+                    op = request['op']
+                    if op not in self.__handlers:
+                        raise ValueError(f"unknown operation '{op}'")
+                    job = await self.__handlers[op](request, writer)
+                    if job and op in STREAM_OPS:
+                        await self.__stream(job, writer)
+                except (ValueError, KeyError, TypeError) as e:
+                    await self.__send(writer, {'event': 'error',
+                                               'error': repr(e)})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def __send(writer: StreamWriter, message: dict) -> None:
+        """
+        Sends a message to a client.
+
+        :param writer: A writer of a client connection.
+        :param message: A message to be sent.
+        """
+        writer.write(dumps(message).encode() + b'\n')
+        await writer.drain()
+
+    def __job(self, request: dict) -> Job:
+        """
+        Returns a job referenced by a request.
+
+        :param request: A request referencing the job.
+        :return: A job referenced by the request.
+        :raises: KeyError if the job does not exist.
+        """
+        job_id = int(request['job'])
+        if job_id not in self.__jobs:
+            raise KeyError(f'unknown job {job_id}')
+
+        return self.__jobs[job_id]
+
+    @staticmethod
+    def __time_limit(request: dict) -> float:
+        """
+        Returns a time limit of a request.
+
+        :param request: A request with 'time_limit' in minutes.
+        :return: A time limit of the request in minutes.
+        :raises: ValueError if the time limit is not finite and positive.
+        """
+        time_limit = float(request['time_limit'])
+        if not isfinite(time_limit) or time_limit <= 0:
+            raise ValueError(f'invalid time limit {time_limit}')
+
+        return time_limit
+
+    async def __op_solve(self, request: dict, writer: StreamWriter) -> Job:
+        """
+        Submits a new job, or joins an identical job in flight (the same
+        instance and parameters). A time limit of a joined job is extended to
+        the later one.
+
+        :param request: A request with 'instance', 'd1', 'd2', and
+                        'time_limit' in minutes.
+        :param writer: A writer of a client connection.
+        :return: The submitted job.
+        """
+        # only plain names of instances in the input directory are accepted,
+        # names are used in paths of input and output files
+        name = str(request['instance'])
+        if name not in get_inp_names():
+            raise ValueError(f"an instance '{name}' has not been found")
+        d1, d2 = int(request['d1']), int(request['d2'])
+        time_limit = self.__time_limit(request)
+
+        # deduplication of identical in-flight jobs
+        deduplicated = (name, d1, d2) in self.__in_flight
+        if deduplicated:
+            job = self.__in_flight[name, d1, d2]
+            if time_limit > job.time_limit:
+                job.time_limit = time_limit
+                job.wakeup.set()
+        else:
+            job = Job(next(self.__ids), name, d1, d2, time_limit)
+            self.__jobs[job.id] = job
+            self.__in_flight[job.key] = job
+            get_running_loop().create_task(self.__run(job))
+
+        await self.__send(writer, {'event': 'accepted', 'job': job.id,
+                                   'deduplicated': deduplicated})
+        return job
+
+    async def __op_watch(self, request: dict, _: StreamWriter) -> Job:
+        """
+        Returns a job whose events are streamed.
+
+        :param request: A request with 'job'.
+        :return: The watched job.
+        """
+        return self.__job(request)
+
+    async def __op_cancel(self, request: dict, writer: StreamWriter) -> None:
+        """
+        Cancels a job.
+
+        :param request: A request with 'job'.
+        :param writer: A writer of a client connection.
+        """
+        job = self.__job(request)
+        if job.status == 'queued':
+            job.cancelled = True
+            self.__finish(job)
+        elif job.status == 'running':
+            job.cancelled = True
+            job.wakeup.set()
+        await self.__send(writer, {'event': 'status', **job.summary()})
+
+    async def __op_deadline(self, request: dict, writer: StreamWriter) \
+            -> None:
+        """
+        Changes a time limit of a queued or running job.
+
+        :param request: A request with 'job' and 'time_limit' in minutes.
+        :param writer: A writer of a client connection.
+        :raises: ValueError if the job is neither queued nor running.
+        """
+        job = self.__job(request)
+        if job.status not in ('queued', 'running'):
+            raise ValueError(f'job {job.id} is {job.status}')
+        job.time_limit = self.__time_limit(request)
+        job.wakeup.set()
+        job.publish('deadline', time_limit=job.time_limit)
+        await self.__send(writer, {'event': 'status', **job.summary()})
+
+    async def __op_status(self, request: dict, writer: StreamWriter) -> None:
+        """
+        Sends a summary of a job, or of all jobs if no job is given.
+
+        :param request: A request with an optional 'job'.
+        :param writer: A writer of a client connection.
+        """
+        if 'job' in request:
+            await self.__send(writer,
+                              {'event': 'status',
+                               **self.__job(request).summary()})
+        else:
+            await self.__send(writer, {'event': 'jobs', 'jobs': [
+                job.summary() for job in self.__jobs.values()]})
+
+    async def __stream(self, job: Job, writer: StreamWriter) -> None:
+        """
+        Streams events of a job to a client until the job is done.
+
+        :param job: A job whose events are streamed.
+        :param writer: A writer of a client connection.
+        """
+        queue = job.subscribe()
+        try:
+            await self.__send(writer, {'event': 'status', **job.summary()})
+            if job.status in ('finished', 'cancelled', 'failed'):
+                await self.__send(writer, {'event': 'done', **job.summary()})
+                return
+
+            while True:
+                message = await queue.get()
+                await self.__send(writer, message)
+                if message['event'] == 'done':
+                    break
+        finally:
+            job.unsubscribe(queue)
+
+    def __receive(self, job: Job, conn: Connection) -> None:
+        """
+        Receives solutions found by a worker process of a job, or an error
+        of the worker process.
+
+        :param job: A job of the worker process.
+        :param conn: A connection with the worker process.
+        """
+        try:
+            while conn.poll():
+                solution = conn.recv()
+                if 'error' in solution:
+                    job.error = solution['error']
+                    continue
+                job.incumbent = solution
+                job.improvements += 1
+                job.publish('incumbent', elapsed=job.elapsed,
+                            improvements=job.improvements, **solution)
+        except (EOFError, OSError):
+            get_running_loop().remove_reader(conn.fileno())
+            job.exited = True
+            job.wakeup.set()
+
+    def __finish(self, job: Job) -> None:
+        """
+        Finishes a job and notifies its subscribers. A worker process never
+        exits on its own unless it fails.
+
+        :param job: A job to be finished.
+        """
+        if job.cancelled:
+            job.status = 'cancelled'
+        elif job.exited:
+            job.status = 'failed'
+            if not job.error:
+                job.error = f'the worker exited with code {job.exitcode}'
+        else:
+            job.status = 'finished'
+        job.end = monotonic()
+        del self.__in_flight[job.key]
+        job.publish('done', **job.summary())
+
+    async def __run(self, job: Job) -> None:
+        """
+        Runs a job in a worker process once a slot in the pool is free, and
+        terminates it when it is cancelled or its time limit is exceeded.
+
+        :param job: A job to be run.
+        """
+        loop = get_running_loop()
+        async with self.__slots:
+            # a job cancelled while it has been queued is already finished
+            if job.cancelled:
+                return
+            conn, worker_conn = CONTEXT.Pipe(duplex=False)
+            process = CONTEXT.Process(
+                target=solve, daemon=True,
+                args=(get_inp_file(job.name), job.d1, job.d2, job.name,
+                      worker_conn))
+            process.start()
+            worker_conn.close()
+
+            job.start = monotonic()
+            job.status = 'running'
+            job.publish('status', **job.summary())
+            loop.add_reader(conn.fileno(), self.__receive, job, conn)
+
+            while not job.cancelled and not job.exited:
+                remaining = job.start + job.time_limit * 60 - monotonic()
+                if remaining <= 0:
+                    break
+                job.wakeup.clear()
+                try:
+                    await wait_for(job.wakeup.wait(), remaining)
+                except TimeoutError:
+                    pass
+
+            if not job.exited:
+                self.__receive(job, conn)
+                loop.remove_reader(conn.fileno())
+            process.terminate()
+            await loop.run_in_executor(None, process.join)
+            job.exitcode = process.exitcode
+            conn.close()
+
+        self.__finish(job)
+
+
+async def serve(path: str, workers: int) -> None:
+    """
+    Runs the solve service on a Unix socket.
+
+    :param path: A path of the Unix socket.
+    :param workers: The maximal number of concurrently running jobs.
+    """
+    service = Service(workers)
+    server = await start_unix_server(service.handle, path)
+    print(f"The service is listening on '{path}' with {workers} workers.")
+    async with server:
+        await server.serve_forever()
+
+
+ARGC = 2  # minimal number of expected arguments
+
+if __name__ == '__main__':
+    if len(argv) not in (ARGC, ARGC + 1):
+        print(f'Error: expecting {ARGC - 1} or {ARGC} arguments:'
+              f' {argv[0]} socket [workers]')
+        exit(1)
+
+    try:
+        run(serve(argv[1], int(argv[2]) if len(argv) > ARGC else cpu_count()))
+    except KeyboardInterrupt:
+        pass
+    exit(0)
@@ -6,8 +6,11 @@
 
 from inp import parse_inp_file
 from out import print_solution
+from window import ConstraintWindow
 from datetime import datetime
-from numpy import ndarray, arange, tile, where, zeros, int32, unique, roll
+from typing import Callable
+from numpy import ndarray, arange, tile, where, zeros, int32, roll, \
+    ones, full, minimum, maximum, argsort
 from numpy.random import choice
 
 
@@ -20,9 +23,11 @@ class Tup:
     """ A class that represents the Traveling Umpire Problem. """
 
     PENALTY = 1_000  # implicit value of a penalty
+    PENALTY_GROWTH = 2  # growth/decay factor of adaptive penalty weights
 
     def __init__(self, inp_file: str, d1: int, d2: int, name: str,
-                 time_limit: int) -> None:
+                 time_limit: int,
+                 observer: Callable[[int, bool, str], None] = None) -> None:
         """
         Constructs the Traveling Umpire Problem.
 
@@ -31,6 +36,8 @@ class Tup:
         :param d2: The parameter d2 for 5. constraint.
         :param name: A name of an instance of the problem.
         :param time_limit: A time limit of the computation in minutes.
+        :param observer: A function called with a distance, feasibility, and
+                         a solution whenever a solution is printed.
         """
         super().__init__()
 
@@ -42,10 +49,12 @@ class Tup:
         self.__q1 = self.umps - d1
         self.__q2 = int(self.umps / 2) - d2
         self.__penalty = self.umps * self.PENALTY
+        self.__weights = ones((2, self.rounds), dtype=int32)
         self.solution = self.init_solution(self.rounds, self.umps)
         self.__backtracked = [True] + [False] * (self.rounds - 1)
         self.__time_limit = time_limit
         self.__time = datetime.now()
+        self.__observer = observer
 
     @property
     def umps(self) -> int:
@@ -92,6 +101,16 @@ class Tup:
         """
         return self.__penalty
 
+    @property
+    def weights(self) -> ndarray:
+        """
+        Returns adaptive weights of penalties for 4. and 5. constraint (rows)
+        in single rounds (columns).
+
+        :return: Adaptive weights of penalties for 4. and 5. constraint.
+        """
+        return self.__weights
+
     @property
     def solution(self) -> ndarray:
         """
@@ -129,6 +148,20 @@ class Tup:
         if duration >= self.__time_limit:
             raise TimeLimitException
 
+    def update_weights(self, violations: ndarray) -> None:
+        """
+        Updates adaptive weights of penalties according to violations of
+        a local optimum. Weights of constraints violated in a given round are
+        increased (up to the implicit value of a penalty), the others are
+        decreased (down to one).
+
+        :param violations: Flags of violated 4. and 5. constraint (rows) in
+                           single rounds (columns).
+        """
+        grown = minimum(self.__weights * self.PENALTY_GROWTH, self.PENALTY)
+        decayed = maximum(self.__weights // self.PENALTY_GROWTH, 1)
+        self.__weights = where(violations > 0, grown, decayed).astype(int32)
+
     @staticmethod
     def __build_schedule(opp: ndarray) -> ndarray:
         """
@@ -154,7 +187,9 @@ class Tup:
     @staticmethod
     def init_solution(rounds: int, umps: int) -> ndarray:
         """
-        Returns an initial solution (a solution of the first round).
+        Returns an initial solution (a solution of the first round). Umpires
+        are interchangeable, so the i-th umpire has the i-th game in the first
+        round (the symmetry breaking), i.e. solutions are in a canonical form.
 
         :param rounds: The number of rounds.
         :param umps: The number of umpires.
@@ -163,14 +198,27 @@ class Tup:
         solution = zeros((rounds, umps), dtype=int32)
 
         ump_indexes = arange(umps)
-        for r in range(rounds):
+        solution[0] = ump_indexes + 1
+        for r in range(1, rounds):
             solution[r] = choice(ump_indexes, size=umps, replace=False) + 1
 
         return solution
 
+    @staticmethod
+    def canonical_solution(solution: ndarray) -> ndarray:
+        """
+        Returns a canonical form of a solution. Umpires are interchangeable,
+        so they are relabelled such that the i-th umpire has the i-th game in
+        the first round.
+
+        :param solution: A solution to be canonicalized.
+        :return: A canonical form of the solution.
+        """
+        return solution[:, argsort(solution[0])]
+
     def print_solution(self) -> None:
         """
-        Prints the solution.
+        Prints the solution and passes it to an observer, if any.
         """
         r = self.rounds - 1
         constraints = \
@@ -185,8 +233,12 @@ class Tup:
         game_matrix = tile(game_numbers, (self.rounds, 1))
         for game in game_numbers:
             solution[:, game - 1] = game_matrix[where(self.solution == game)]
-        print_solution(','.join(map(str, solution.flatten())),
-                       self.__name, self.q1, self.q2)
+        solution = ','.join(map(str, solution.flatten()))
+        print_solution(solution, self.__name, self.q1, self.q2)
+
+        if self.__observer:
+            distance = int(self.umps_distances(self.solution, r).sum())
+            self.__observer(distance, not bool(constraints.sum()), solution)
 
     def venues_of_umps(self, solution: ndarray, home=True) -> ndarray:
         """
@@ -253,22 +305,25 @@ class Tup:
         venues = self.venues_of_umps(solution)
         constraint = zeros(venues.shape, dtype=int32)
 
-        venue_numbers = arange(1, self.__teams + 1)
-        for venue in range(venues.shape[1]):
-            unvisit_venues = \
-                set(venue_numbers) - set(unique(venues[:curr_round + 1, venue]))
-            for _ in unvisit_venues:
-                constraint[-1, venue] += self.penalty
+        # visited venues of all umpires at once
+        visited = zeros((venues.shape[1], self.__teams + 1), dtype=bool)
+        umps = tile(arange(venues.shape[1]), (curr_round + 1, 1))
+        visited[umps, venues[:curr_round + 1]] = True
+        unvisited = self.__teams - visited[:, 1:].sum(axis=1)
+        constraint[-1] = unvisited * self.penalty
 
         return constraint
 
-    def constraint4(self, solution: ndarray, curr_round: int) -> ndarray:
+    def constraint4(self, solution: ndarray, curr_round: int,
+                    weights: ndarray = None) -> ndarray:
         """
         4. constraint: No umpire is in the same venue more than once in any
                        q1 consecutive rounds.
 
         :param solution: A solution for calculating 4. constraint.
         :param curr_round: A current round.
+        :param weights: Weights of penalties in single rounds. The implicit
+                        value of a penalty is used if it is not given.
         :return: A matrix with penalties where assignment violates
                  4. constraint.
         """
@@ -285,17 +340,22 @@ class Tup:
 
             constraint[curr_round + 1:] = 0
 
-        constraint *= self.penalty * self.PENALTY
+        if weights is None:
+            weights = full(self.rounds, self.PENALTY, dtype=int32)
+        constraint *= self.penalty * weights.reshape((-1, 1))
 
         return constraint
 
-    def constraint5(self, solution: ndarray, curr_round: int) -> ndarray:
+    def constraint5(self, solution: ndarray, curr_round: int,
+                    weights: ndarray = None) -> ndarray:
         """
         5. constraint: No umpire sees a team more than once in any q2
                        consecutive rounds.
 
         :param solution: A solution for calculating 5. constraint.
         :param curr_round: A current round.
+        :param weights: Weights of penalties in single rounds. The implicit
+                        value of a penalty is used if it is not given.
         :return: A matrix with penalties where assignment violates
                  5. constraint.
         """
@@ -320,6 +380,63 @@ class Tup:
 
             constraint[curr_round + 1:] = 0
 
-        constraint *= self.penalty * self.PENALTY
+        if weights is None:
+            weights = full(self.rounds, self.PENALTY, dtype=int32)
+        constraint *= self.penalty * weights.reshape((-1, 1))
 
         return constraint
+
+    def constraint_window(self, curr_round: int) -> ConstraintWindow:
+        """
+        Builds a window of venues of umpires for 4. and 5. constraint from
+        rounds of the solution before a current round.
+
+        :param curr_round: A current round.
+        :return: A window advanced to a current round.
+        """
+        window = ConstraintWindow(self.q1, self.q2, self.umps)
+        for r in range(curr_round):
+            self.advance_window(window, r)
+
+        return window
+
+    def advance_window(self, window: ConstraintWindow, curr_round: int) \
+            -> None:
+        """
+        Advances a window by a current round of the solution.
+
+        :param window: A window advanced to a current round.
+        :param curr_round: A current round.
+        """
+        games = self.solution[curr_round] - 1
+        window.advance(self.__schedule[curr_round, games, 0],
+                       self.__schedule[curr_round, games, 1])
+
+    def window_constraints(self, window: ConstraintWindow, curr_round: int) \
+            -> (ndarray, ndarray):
+        """
+        Calculates penalties of 4. and 5. constraint for the Cartesian
+        product of umpires and games of a current round of the solution
+        (see solutions_cart_product) using a window advanced to a current
+        round.
+
+        :param window: A window advanced to a current round.
+        :param curr_round: A current round.
+        :return: A tuple with penalties of 4. and 5. constraint in a current
+                 round, and penalties of 4. and 5. constraint in previous
+                 rounds.
+        """
+        games = self.solution[curr_round] - 1
+        constraint4, constraint5 = window.violations(
+            self.__schedule[curr_round, games, 0],
+            self.__schedule[curr_round, games, 1])
+        prev_constraints = \
+            (window.violations4 + window.violations5).reshape((-1, 1))
+
+        penalty = self.penalty * self.PENALTY
+        constraints = (constraint4 + constraint5).flatten() * penalty
+        prev_constraints = \
+            tile(prev_constraints, (1, self.umps)).flatten().astype(int) \
+            * penalty
+
+        return constraints, prev_constraints
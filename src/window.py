@@ -0,0 +1,108 @@
+# Project: VUT FIT SNT Project - Traveling Umpire Problem
+# Author: Dominik Harmim <harmim6@gmail.com>
+# Year: 2020
+# Description: A definition of a class that represents a window of venues of
+#              umpires in the last rounds for 4. and 5. constraint.
+
+from copy import deepcopy
+from numpy import ndarray, arange, full, zeros, int32
+
+
+class ConstraintWindow:
+    """
+    A class that represents a window of venues of umpires in the last rounds.
+    Venues are kept in a ring buffer with max(q1, q2) - 1 rounds, which are
+    enough for evaluating 4. and 5. constraint in the next round.
+    """
+
+    def __init__(self, q1: int, q2: int, umps: int) -> None:
+        """
+        Constructs an empty window.
+
+        :param q1: The parameter q1 for 4. constraint.
+        :param q2: The parameter q2 for 5. constraint.
+        :param umps: The number of umpires.
+        """
+        super().__init__()
+
+        self.__q1 = q1
+        self.__q2 = q2
+        self.__size = max(q1, q2, 2) - 1
+        self.__venues = full((self.__size, umps), -1, dtype=int32)
+        self.__out_venues = full((self.__size, umps), -1, dtype=int32)
+        self.__next = 0
+        self.__violations4 = zeros(umps, dtype=int32)
+        self.__violations5 = zeros(umps, dtype=int32)
+
+    @property
+    def violations4(self) -> ndarray:
+        """
+        Returns the number of violations of 4. constraint of single umpires
+        in rounds in the window so far.
+
+        :return: The number of violations of 4. constraint of single umpires.
+        """
+        return self.__violations4
+
+    @property
+    def violations5(self) -> ndarray:
+        """
+        Returns the number of violations of 5. constraint of single umpires
+        in rounds in the window so far.
+
+        :return: The number of violations of 5. constraint of single umpires.
+        """
+        return self.__violations5
+
+    def copy(self) -> 'ConstraintWindow':
+        """
+        Returns a copy of the window.
+
+        :return: A copy of the window.
+        """
+        return deepcopy(self)
+
+    def violations(self, venues: ndarray, out_venues: ndarray) \
+            -> (ndarray, ndarray):
+        """
+        Calculates the number of violations of 4. and 5. constraint in the
+        next round for all pairs of an umpire (rows) and a game (columns).
+
+        :param venues: Home venues of games in the next round.
+        :param out_venues: Out venues of games in the next round.
+        :return: A tuple with matrices of the number of violations of 4. and
+                 5. constraint.
+        """
+        # ages of rounds in the ring buffer, 0 is the last round
+        ages = (self.__next - 1 - arange(self.__size)) % self.__size
+        in_q1 = (ages < self.__q1 - 1).reshape((-1, 1, 1))
+        in_q2 = (ages < self.__q2 - 1).reshape((-1, 1, 1))
+
+        last_venues = self.__venues.reshape((self.__size, -1, 1))
+        last_out_venues = self.__out_venues.reshape((self.__size, -1, 1))
+        venues = venues.reshape((1, 1, -1))
+        out_venues = out_venues.reshape((1, 1, -1))
+
+        constraint4 = ((last_venues == venues) & in_q1).sum(axis=0)
+        constraint5 = \
+            ((last_venues == venues) & in_q2).sum(axis=0) \
+            + ((last_venues == out_venues) & in_q2).sum(axis=0) \
+            + ((last_out_venues == venues) & in_q2).sum(axis=0) \
+            + ((last_out_venues == out_venues) & in_q2).sum(axis=0)
+
+        return constraint4.astype(int32), constraint5.astype(int32)
+
+    def advance(self, venues: ndarray, out_venues: ndarray) -> None:
+        """
+        Advances the window by a round with given venues of umpires.
+
+        :param venues: Home venues of umpires in the round.
+        :param out_venues: Out venues of umpires in the round.
+        """
+        constraint4, constraint5 = self.violations(venues, out_venues)
+        self.__violations4 += constraint4.diagonal()
+        self.__violations5 += constraint5.diagonal()
+
+        self.__venues[self.__next] = venues
+        self.__out_venues[self.__next] = out_venues
+        self.__next = (self.__next + 1) % self.__size